@@ -1,27 +1,48 @@
 import pandas as pd
-import numpy as np
-import requests as requests
 import streamlit as st
-import time
-import json as json
 import random as random
+import os
 
 import api_queries as api
-import viz as viz
+import export
+import warm_cache
+from institutions import df_swissuniversities_members
+
+
+@st.cache_resource(show_spinner=False)
+def start_cache_warming():
+    """Starts the background refresh of the swissuniversities samples once per server process"""
+    return warm_cache.start_scheduler()
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def get_cached_warm_sample(institution_id, sample):
+    warm_sample = warm_cache.get_sample(institution_id, sample)
+    if warm_sample is None:
+        raise LookupError(institution_id)  # exceptions are not cached
+    return warm_sample
+
+
+def get_warm_sample(institution_id, sample):
+    """Only the found samples are cached, so that samples warmed in the meantime are found"""
+    try:
+        return get_cached_warm_sample(institution_id, sample)
+    except LookupError:
+        return None
 
 
-@st.cache_data()
 def get_random_institution(df0):
-    temp = random.randrange(len(df0))
-    return df0['institution_id'][temp], df0['institution_name'][temp]
+    """The random institution is kept in the session until a new random sample is requested"""
+    if 'random_institution' not in st.session_state:
+        temp = random.randrange(len(df0))
+        st.session_state['random_institution'] = df0['institution_id'][temp], df0['institution_name'][temp]
+    return st.session_state['random_institution']
 
 
-def format_doi_list(doi_list):
-    """Input: a list of DOIs. Output: same list of DOIs in short form without duplicates and in lower cases"""
-    doi_list = [doi for doi in doi_list if ('10.' in doi)]  # Only keep elements which contain 10.
-    doi_list = [doi[doi.find('10.'):].lower() for doi in doi_list]  # Short DOI format
-    doi_list = list(dict.fromkeys(doi_list))  # remove duplicates
-    return doi_list
+def get_warm_sample_index(institution_id):
+    """Index of the warm sample of the institution, reset when another institution is selected"""
+    warm_sample_index = st.session_state.get('warm_sample_index', (institution_id, 0))
+    return warm_sample_index[1] if warm_sample_index[0] == institution_id else 0
 
 
 def prepare_df(df0, doi_list):
@@ -53,6 +74,8 @@ def prepare_df(df0, doi_list):
 
 
 def generate_tab(df0, count, databases):
+    import viz as viz  # plotly is only imported once data is loaded, not on the first paint
+
     st.header(f'{count.capitalize()} count')
 
     cols = st.columns([4, 1], gap='large')
@@ -79,6 +102,8 @@ def generate_tab(df0, count, databases):
 
 
 def generate_tab_direct(df0, count, tab):
+    import viz as viz
+
     with tab: 
         st.header(f'{count.capitalize()} count')
         cols = st.columns([4, 1], gap='large')
@@ -95,13 +120,17 @@ def generate_docs():
     st.write('The *Citations count* corresponds to the *is-referenced-by-count* field.')
     st.write('The *References count* corresponds to the *references-count* field.')
     st.write('The *Authors count* is computed by getting the length of the *author* field.')
+    st.subheader('DataCite')
+    st.write('The *Citations count* corresponds to the *citationCount* field.')
+    st.write('The *References count* corresponds to the *referenceCount* field.')
+    st.write('The *Authors count* is computed by getting the length of the *creators* field.')
     st.subheader('OpenAIRE')
     st.write('The *Citations count* corresponds to the score of *influence_alt* in the *measure* field.')
     st.write('The *References count* is set to *None*, since the API does not provide a direct reference count.')
     st.write('The *Authors count* is computed by taking the length of the authors list in the record.')
     st.subheader('OpenAlex')
     st.write('The *Citations count* corresponds to the *cited_by_count* field.')
-    st.write('The *References count* is computed by getting the length of the *referenced_work* field.')
+    st.write('The *References count* corresponds to the *referenced_works_count* field.')
     st.write('The *Authors count* is computed by getting the length of the *authorships* field.')
     st.subheader('OpenCitations')
     st.write('The *Citations count* corresponds to the *citation-count* in the OpenCitations Index')
@@ -113,55 +142,23 @@ def generate_docs():
     st.write('The *Authors count* is computing by getting the length of the *authors* field.')
 
 
-def csv_download_button():
-    st.download_button("Click to Download data (csv)", csv, "counts.csv")
-
-df_swissuniversities_members = pd.DataFrame([
-    ['École Polytechnique Fédérale de Lausanne', 'https://openalex.org/I5124864'],
-    ['ETH Zurich', 'https://openalex.org/I35440088'],
-    ['University of Basel', 'https://openalex.org/I1850255'],
-    ['University of Bern', 'https://openalex.org/I118564535'],
-    ['University of Fribourg', 'https://openalex.org/I154338468'],
-    ['University of Geneva', 'https://openalex.org/I114457229'],
-    ['University of Lausanne', 'https://openalex.org/I97565354'],
-    ['University of Lucerne', 'https://openalex.org/I161941770'],
-    ['University of Neuchâtel', 'https://openalex.org/I57825437'],
-    ['University of St. Gallen', 'https://openalex.org/I202963720'],
-    ['Università della Svizzera italiana', 'https://openalex.org/I57201433'],
-    ['University of Zurich', 'https://openalex.org/I202697423'],
-    ['Bern University of Applied Sciences', 'https://openalex.org/I130692619'],
-    ['University of Applied Sciences of the Grisons', 'https://openalex.org/I4210120439'],
-    ['University of Applied Sciences and Arts Northwestern Switzerland', 'https://openalex.org/I2972652528'],
-    ['University of Applied Sciences and Arts Western Switzerland', 'https://openalex.org/I173439891'],
-    ['Lucerne University of Applied Sciences and Arts', 'https://openalex.org/I81007117'],
-    ['Kalaidos University of Applied Sciences', 'https://openalex.org/I3132934759'],
-    ['Ostschweizer Fachhochschule OST', 'https://openalex.org/I4210129390'],
-    ['University of Applied Sciences and Arts of Southern Switzerland', 'https://openalex.org/I15196421'],
-    ['Zurich University of the Arts', 'https://openalex.org/I64152125'],
-    ['ZHAW Zurich University of Applied Sciences', 'https://openalex.org/I200744771'],
-    ['Haute École Pédagogique BEJUNE', 'https://openalex.org/I4210101117'],
-    ['Haute École Pédagogique du Canton de Vaud', 'https://openalex.org/I4210106586'],
-    ['Pädagogische Hochschule Wallis', 'https://openalex.org/I4210141884'],
-    ['Haute École Pédagogique Fribourg', 'https://openalex.org/I4210137605'],
-    ['NMS Berne', 'https://openalex.org/I4210143584'],
-    ['University of Teacher Education in Special Needs', 'https://openalex.org/I4210086400'],
-    ['Pädagogische Hochschule Graubünden', 'https://openalex.org/I4210117930'],
-    ['Pädagogische Hochschule Bern', 'https://openalex.org/I4210160491'],
-    ['University of Teacher Education Lucerne', 'https://openalex.org/I4210112078'],
-    ['St.Gallen University of Teacher Education', 'https://openalex.org/I4210158813'],
-    ['Pädagogische Hochschule Schaffhausen', 'https://openalex.org/I4210139224'],
-    ['Schwyz University of Teacher Education', 'https://openalex.org/I4210095907'],
-    ['Thurgau University of Teacher Education', 'https://openalex.org/I4210138261'],
-    ['Zurich University of Teacher Education', 'https://openalex.org/I4210111868'],
-    ['University of Teacher Education Zug', 'https://openalex.org/I4210146564'],
-    ['Swiss Federal University for Vocational Education and Training SFUVET', 'https://openalex.org/I4210097053']],
-    columns=['institution_name', 'institution_id'])
+def download_tab():
+    layout = st.radio('Select a layout', ('Pivoted (one column per data source)', 'Long (one row per count)'))
+    file_format = st.selectbox('Select a file format', export.FILE_FORMATS)
+    # The file is only generated on request, not on every rerun
+    if st.button('Prepare file'):
+        with st.spinner(text=f"Preparing {file_format} file..."):
+            data = export.to_bytes(df_pivoted if layout.startswith('Pivoted') else df, file_format)
+        st.download_button(f"Click to Download data ({file_format})", data, f"counts.{file_format}",
+                           mime=export.MIME_TYPES[file_format])
 
 
 ########## Page config
 
 st.set_page_config(layout="wide", 
                    page_title="Track your open scholarly metadata")
+if os.environ.get('WARM_CACHE_SCHEDULER', '1') == '1':  # disabled e.g. by bench_startup.py
+    start_cache_warming()
 
 
 ############ Streamlit App Sidebar
@@ -176,13 +173,14 @@ css = '''
 st.markdown(css, unsafe_allow_html=True)
 
 example = 0
+warm_sample = None
 dois = ''
 sample = []
 
 with st.sidebar:
     st.title('Input')
     with st.expander('DOIs', expanded=True):
-        sample_size = 10  # should be <= 20
+        sample_size = warm_cache.SAMPLE_SIZE  # should be <= 20
         input_method = st.radio('Select a method',
                                 ('Manually',
                                 f'Random sample of {sample_size} DOIs from OpenAlex',))
@@ -209,7 +207,13 @@ with st.sidebar:
                 # ):
                 # with st.spinner(text=f"Loading OpenAlex sample..."):
                 if institution_name:
-                    example = api.get_openalex_sample(sample_size, institution_id)
+                    # Samples precomputed by the scheduler are used when available
+                    # Once the warm samples are used up, the samples are drawn live from OpenAlex
+                    warm_sample = get_warm_sample(institution_id, get_warm_sample_index(institution_id))
+                    if warm_sample is not None:
+                        example, warm_sources, warm_counts = warm_sample
+                    else:
+                        example = api.get_openalex_sample(sample_size, institution_id)
                     input_method += f' with an author affiliation \n to {institution_name}'
             elif input_institution == 'OpenAlex institution ID':
                 institution_id = st.text_input("Enter the OpenAlex id of your institution")
@@ -217,33 +221,37 @@ with st.sidebar:
                     st.write('You can find OpenAlex id using this link: https://explore.openalex.org/')
                     # st.stop()
                 else:
-                    url = f"https://api.openalex.org/institutions/{institution_id}"
-                    r = requests.get(url)
-                    if r.status_code == 404:
+                    institution = api.get_openalex_institution(institution_id)
+                    if institution is None:
                         random_button = st.warning(
                             'Please enter a valid institution OpenAlex id (https://explore.openalex.org/).')
                         st.stop()
                     else:
-                        institution_id = r.json()['id']
-                        institution_name = r.json()['display_name']
+                        institution_id, institution_name = institution
                         input_method += f' with an author affiliation \n to {institution_name}'
                     with st.spinner(text=f"Loading sample..."):
                         example = api.get_openalex_sample(sample_size, institution_id)
 
         if example != 0:
-            dois = format_doi_list(example)
+            dois = api.format_doi_list(example)
 
             if input_method != 'Manually':
                 if st.button('Get new random sample of DOIs'):
-                    st.cache_data.clear()
+                    if warm_sample is not None:
+                        st.session_state['warm_sample_index'] = \
+                            (institution_id, get_warm_sample_index(institution_id) + 1)
+                    else:
+                        st.cache_data.clear()
+                    st.session_state.pop('random_institution', None)
+                    st.experimental_rerun()
             st.write(f'Input: {input_method}')
             st.text(f'Number of unique DOIs: {len(dois)}')
 
     with st.expander('Data sources', expanded=True):
         db_selection = st.multiselect(
             "Select open data sources",
-            ['Crossref', 'OpenAIRE', 'OpenAlex', 'OpenCitations', 'Semantic Scholar'],
-            default=['Crossref', 'OpenAIRE', 'OpenAlex', 'OpenCitations', 'Semantic Scholar'])
+            api.DATA_SOURCES,
+            default=api.DATA_SOURCES)
 
     with st.expander('Polite pool settings'):
         my_email_address = st.text_input("Email address for Crossref and OpenAlex polite pool (optional)", '')
@@ -252,10 +260,14 @@ with st.sidebar:
 
     st.title('Load data')
     if st.button('Click to load data'):
-        load, df = api.load_data(dois, db_selection,
-                                 my_email_address,
-                                 opencitations_access_token,
-                                 semanticscholar_api_key)
+        if warm_sample is not None and db_selection and set(db_selection).issubset(warm_sources) \
+                and not warm_counts.empty:
+            load, df = 'Success', warm_counts[warm_counts['database'].isin(db_selection)]
+        else:
+            load, df = api.load_data(dois, db_selection,
+                                     my_email_address,
+                                     opencitations_access_token,
+                                     semanticscholar_api_key)
         if load == 'Success':
             df, databases, df_pivoted = prepare_df(df, dois)
             if not df.empty:
@@ -271,8 +283,6 @@ with st.sidebar:
 
 
 st.title('Track your open scholarly metadata')
-# if 'df' in st.session_state:
-#     st.download_button("Download data (csv)", csv, "counts.csv")
 
 st.write('''Wondering how your research is being represented in open bibliometric data sources? '''
          '''Enter your DOIs in the sidebar and select some open data sources for an easy comparison. '''
@@ -289,8 +299,6 @@ else:
     df = st.session_state['df']
     databases = st.session_state['databases']
     df_pivoted = st.session_state['df_pivoted']
-    # Data export
-    csv = df_pivoted.to_csv(index=False).encode('utf-8')
 
 # Statistics
 df_pivoted['median'] = df_pivoted[databases].median(axis=1, skipna=True)
@@ -308,7 +316,7 @@ tab_dict = {
     "References count": lambda: generate_tab(df_pivoted, 'references', databases),
     "Authors count": lambda: generate_tab(df_pivoted, 'authors', databases),
     "Documentation": generate_docs, 
-    "Download data": csv_download_button,
+    "Download data": download_tab,
 }
 
 tabs = st.tabs(list(tab_dict.keys()))
@@ -4,6 +4,137 @@ import requests as requests
 import streamlit as st
 import time
 import json as json
+import logging
+import os
+import hashlib
+import gzip
+import zlib
+import uuid
+from contextlib import suppress
+from urllib.parse import quote_plus
+
+import journal
+
+
+JOURNAL_DIR = os.environ.get('JOURNAL_DIR', '.journal')
+JOURNAL_MAX_AGE = 24 * 3600  # seconds, older journals of abandoned loads are removed
+JOURNAL_LOCK_TIMEOUT = 600  # seconds, after which the lock of another session is taken over
+SERVER_START = time.time()  # locks from before a restart of the server are taken over
+
+
+logger = logging.getLogger(__name__)
+
+
+DATA_SOURCES = ['Crossref', 'DataCite', 'OpenAIRE', 'OpenAlex', 'OpenCitations', 'Semantic Scholar']
+
+
+class FetchError(Exception):
+    """Raised when a data source returns an error instead of counts, so that the batch is recorded as
+    failed in the journal and fetched again, instead of being stored as a batch without counts"""
+
+
+def raise_for_provider_error(r):
+    """Raises requests.HTTPError when the data source is rate-limited or unavailable.
+    Other client errors are permanent, so they are not raised, which would fail the batch on every retry"""
+    if (r.status_code == 429) | (r.status_code >= 500):
+        r.raise_for_status()
+
+
+def notify(message, quiet=False, warning=False):
+    """Shows the message in the app, or logs it when quiet, e.g. in the cache warming thread or in the
+    command line tools, where st.write and st.warning have no script run context"""
+    if quiet:
+        logger.log(logging.WARNING if warning else logging.INFO, message)
+    elif warning:
+        st.warning(message)
+    else:
+        st.write(message)
+
+
+def format_doi_list(doi_list):
+    """Input: a list of DOIs. Output: same list of DOIs in short form without duplicates and in lower cases"""
+    doi_list = [doi for doi in doi_list if ('10.' in doi)]  # Only keep elements which contain 10.
+    doi_list = [doi[doi.find('10.'):].lower() for doi in doi_list]  # Short DOI format
+    doi_list = list(dict.fromkeys(doi_list))  # remove duplicates
+    return doi_list
+
+
+def get_counts(source, dois, my_email_address='', opencitations_access_token='', semanticscholar_api_key='',
+               cached=True, quiet=False):
+    """Returns the long-format counts (doi, count, value, database) of one data source for a list of DOIs.
+    With cached=False, the Streamlit cache is bypassed, e.g. for long runs outside of the app.
+    With quiet=True, the messages of the data sources are logged instead of shown in the app"""
+    def fetch(func, *args, **kwargs):
+        if not cached:
+            func = getattr(func, '__wrapped__', func)
+        return func(*args, **kwargs)
+
+    if source == 'Crossref':
+        return fetch(get_crossref_counts, dois, my_email_address, quiet=quiet)
+    if source == 'DataCite':
+        return fetch(get_datacite_counts, dois, quiet=quiet)
+    if source == 'OpenAlex':
+        return fetch(get_openalex_counts, dois, my_email_address, quiet=quiet)
+    if source == 'OpenCitations':
+        return pd.concat([fetch(get_opencitations_index_counts, dois, opencitations_access_token, quiet=quiet),
+                          fetch(get_opencitations_meta_counts, dois, opencitations_access_token, quiet=quiet)])
+    if source == 'Semantic Scholar':
+        return fetch(get_semanticscholar_counts, dois, semanticscholar_api_key, quiet=quiet)
+    if source == 'OpenAIRE':
+        return fetch(get_openaire_counts, dois, quiet=quiet)
+    raise ValueError(f'Unknown data source: {source}')
+
+
+def get_journal_path(doi_list, db_selection):
+    """The journal is keyed on the inputs, so that a load can be resumed after a rerun,
+    a new session or a restart of the server"""
+    key = hashlib.md5(json.dumps([doi_list, db_selection]).encode('utf-8')).hexdigest()
+    return os.path.join(JOURNAL_DIR, f'{key}.jsonl')
+
+
+def remove_old_journals():
+    if not os.path.isdir(JOURNAL_DIR):
+        return
+    for name in os.listdir(JOURNAL_DIR):
+        path = os.path.join(JOURNAL_DIR, name)
+        with suppress(FileNotFoundError):
+            if time.time() - os.path.getmtime(path) > JOURNAL_MAX_AGE:
+                os.remove(path)
+
+
+def acquire_journal(journal_path):
+    """Returns True if the session owns the journal lock. The lock of another session is only taken over
+    if it is older than JOURNAL_LOCK_TIMEOUT or than the server, e.g. after a crash"""
+    if 'journal_session' not in st.session_state:
+        st.session_state['journal_session'] = uuid.uuid4().hex
+    session = st.session_state['journal_session']
+    lock_path = journal_path + '.lock'
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    try:
+        with open(lock_path, 'x') as f:
+            f.write(session)
+        return True
+    except FileExistsError:
+        pass
+    try:
+        with open(lock_path) as f:
+            owner = f.read()
+        lock_time = os.path.getmtime(lock_path)
+    except FileNotFoundError:  # released in the meantime
+        return False
+    if (owner == session) | (lock_time < SERVER_START) | (time.time() - lock_time > JOURNAL_LOCK_TIMEOUT):
+        with open(lock_path, 'w') as f:
+            f.write(session)
+        return True
+    return False
+
+
+def release_journal(journal_path):
+    with suppress(FileNotFoundError):
+        with open(journal_path + '.lock') as f:
+            owner = f.read()
+        if owner == st.session_state.get('journal_session'):
+            os.remove(journal_path + '.lock')
 
 
 def load_data(doi_list, db_selection, my_email_address, opencitations_access_token, semanticscholar_api_key):
@@ -18,33 +149,65 @@ def load_data(doi_list, db_selection, my_email_address, opencitations_access_tok
         st.warning('Select at least one dataset')
         return 'Failure', 0
 
-    df = pd.DataFrame()
-    step = 1
-    if 'Crossref' in db_selection:
-        with st.spinner(text=f"Step {step}/{len(db_selection)}: Loading Crossref data..."):
-            df = pd.concat([df, get_crossref_counts(doi_list, my_email_address)])
-        step += 1
-    if 'OpenAlex' in db_selection:
-        with st.spinner(text=f"Step {step}/{len(db_selection)}: Loading OpenAlex data..."):
-            df = pd.concat([df, get_openalex_counts(doi_list, my_email_address)])
-        step += 1
-    if 'OpenCitations' in db_selection:
-        with st.spinner(text=f"Step {step}/{len(db_selection)}: Loading OpenCitations Index data..."):
-            df = pd.concat([df, get_opencitations_index_counts(doi_list, opencitations_access_token)])
-            df = pd.concat([df, get_opencitations_meta_counts(doi_list, opencitations_access_token)])
-        step += 1
-    if 'Semantic Scholar' in db_selection:
-        with st.spinner(text=f"Step {step}/{len(db_selection)}: Loading Semantic Scholar data..."):
-            df = pd.concat([df, get_semanticscholar_counts(doi_list, semanticscholar_api_key)])
-        step += 1
-    if 'OpenAIRE' in db_selection:
-        with st.spinner(text=f"Step {step}/{len(db_selection)}: Loading OpenAIRE data..."):
-            df = pd.concat([df, get_openaire_counts(doi_list)])
-        step += 1
-    st.success('Counts successfully imported')
+    # Every fetched source is recorded in a journal keyed on the inputs, so that a rerun, a new session
+    # or a restart of the server during the load does not query again the sources which were already
+    # loaded. A session loading the same inputs as another session at the same time loads without journal.
+    remove_old_journals()
+    journal_path = get_journal_path(doi_list, db_selection)
+    if not acquire_journal(journal_path):
+        journal_path = None
+    settings = {
+        'my_email_address': my_email_address,
+        'opencitations_access_token': opencitations_access_token,
+        'semanticscholar_api_key': semanticscholar_api_key,
+    }
+
+    def fetch_counts(source, dois):
+        return get_counts(source, dois, **settings)
+
+    failed = []
+    frames = []
+    try:
+        if journal_path:
+            journal.start(journal_path, doi_list, db_selection, batch_size=len(doi_list))
+        for step, source in enumerate(db_selection, 1):
+            with st.spinner(text=f"Step {step}/{len(db_selection)}: Loading {source} data..."):
+                if journal_path:
+                    failed += journal.fetch(journal_path, fetch_counts, sources=[source])
+                else:
+                    try:
+                        frames.append(fetch_counts(source, doi_list))
+                    except Exception as e:
+                        failed.append({'source': source, 'error': str(e)})
+        if journal_path:
+            df = journal.load(journal_path)
+        else:
+            df = pd.concat(frames) if frames else pd.DataFrame()
+        if journal_path and not failed:
+            with suppress(FileNotFoundError):
+                os.remove(journal_path)
+    finally:
+        if journal_path:
+            release_journal(journal_path)
+    if failed:
+        for entry in failed:
+            st.warning(f"{entry['source']} data could not be loaded: {entry['error']}")
+        st.warning('Click again to retry only these data sources.')
+    else:
+        st.success('Counts successfully imported')
     return 'Success', df
 
 
+@st.cache_data(ttl=24 * 3600, show_spinner=False)
+def get_openalex_institution(institution_id):
+    """Returns the id and the display name of an OpenAlex institution, None if it does not exist"""
+    r = requests.get(f"https://api.openalex.org/institutions/{institution_id}")
+    if r.status_code == 404:
+        return None
+    results = r.json()
+    return results['id'], results['display_name']
+
+
 @st.cache_data(show_spinner=False)
 def get_openalex_sample(sample_size, institution_id, my_email_address=''):
     dois = []
@@ -67,74 +230,101 @@ def get_openalex_sample(sample_size, institution_id, my_email_address=''):
     return dois[0:sample_size]
 
 
+def get_body(url, params):
+    """Returns the response, its decoded body and the size in bytes of the body as received,
+    i.e. compressed when the response is gzipped. The bytes are counted on the raw stream, since
+    Content-Length is missing for chunked responses and the decoded body is larger than the transfer"""
+    r = requests.get(url, params=params, headers={'Accept-Encoding': 'gzip, deflate'}, stream=True)
+    body = b''.join(r.raw.stream(64 * 1024, decode_content=False))
+    size = len(body)
+    encoding = r.headers.get('Content-Encoding', '').lower()
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    elif encoding == 'deflate':
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:  # raw deflate stream without zlib header
+            body = zlib.decompress(body, -zlib.MAX_WBITS)
+    return r, body, size
+
+
 @st.cache_data(show_spinner=False)
-def get_crossref_counts(dois, my_email_address):
+def get_crossref_counts(dois, my_email_address, quiet=False):
     start_time = time.time()
     url = f"https://api.crossref.org/works/"
     params = {
         f'filter': 'doi:' + ',doi:'.join(dois),
-        f'select': 'DOI,is-referenced-by-count,references-count,author',
+        f'select': 'DOI,is-referenced-by-count,references-count,author',  # Crossref has no author count field
+        f'rows': len(dois),  # default is 20 rows
         f'mailto': f'{my_email_address}'
     }
-    r = requests.get(url, params=params)
-    if r.json()['status'] == 'failed':
-        st.warning(r.json()['message'][0]['message'])
-        return pd.DataFrame()
-    all_results = r.json()['message']['items']
-    df_counts = pd.DataFrame(all_results)
+    r, body, size = get_body(url, params)
+    raise_for_provider_error(r)
+    results = json.loads(body)
+    if results['status'] == 'failed':
+        raise FetchError(results['message'][0]['message'])
+    # The author lists are only counted, they are not loaded in the df
+    df_counts = pd.DataFrame([{
+        'doi': item['DOI'].lower(),
+        'citations': item.get('is-referenced-by-count'),
+        'references': item.get('references-count'),
+        'authors': len(item['author']) if isinstance(item.get('author'), list) else np.nan
+    } for item in results['message']['items']])
     if not df_counts.empty:
-        df_counts['author'] = df_counts['author'].apply(lambda x: len(x) if isinstance(x, list) else np.nan)
-        df_counts['DOI'] = df_counts['DOI'].str.lower()
-        df_counts = df_counts.rename({'DOI': 'doi',
-                                      'is-referenced-by-count': 'citations',
-                                      'references-count': 'references',
-                                      'author': 'authors'}, axis=1)
         df_counts = pd.melt(df_counts, 'doi', var_name='count', value_name='value')
     else:
         pass
     df_counts['database'] = 'Crossref'
-    st.write(f'Crossref data loaded in %.2f seconds.' % (time.time() - start_time))
+    notify(f'Crossref data loaded in %.2f seconds (%.1f kB compressed response per DOI).'
+           % (time.time() - start_time, size / 1000 / max(len(dois), 1)), quiet)
     return df_counts
 
 
 @st.cache_data(show_spinner=False)
-def get_openalex_counts(dois, my_email_address=''):
+def get_openalex_counts(dois, my_email_address='', count_only=True, quiet=False):
+    """With count_only, the count field referenced_works_count is requested instead of the list of
+    referenced works. OpenAlex has no author count field, so the authorships are always requested"""
     start_time = time.time()
     full_dois = ['https://doi.org/' + doi for doi in dois]
     url = f"https://api.openalex.org/works"
+    references_field = 'referenced_works_count' if count_only else 'referenced_works'
     params = {
         'filter': f'doi:{"|".join(full_dois)}',
-        'select': 'doi,cited_by_count,referenced_works,authorships',
+        'select': f'doi,cited_by_count,{references_field},authorships',
+        'per_page': 200,  # default is 25 results
         'mailto': f'{my_email_address}'
     }
-    r = requests.get(url, params=params)
-    results = r.json()['results']
-    df_counts = pd.DataFrame(results)
+    r, body, size = get_body(url, params)
+    r.raise_for_status()
+    results = json.loads(body)['results']
+    df_counts = pd.DataFrame([{
+        'doi': item['doi'],
+        'citations': item.get('cited_by_count'),
+        'references': item.get('referenced_works_count') if count_only else
+        (len(item['referenced_works']) if isinstance(item.get('referenced_works'), list) else 0),
+        'authors': len(item['authorships']) if isinstance(item.get('authorships'), list) else 0
+    } for item in results])
     if not df_counts.empty:
-        df_counts['referenced_works'] = df_counts['referenced_works']. \
-                apply(lambda x: len(x) if isinstance(x, list) else 0)
-        df_counts['authorships'] = df_counts['authorships'].apply(lambda x: len(x) if isinstance(x, list) else 0)
-        df_counts = df_counts.rename({'cited_by_count': 'citations',
-                                      'referenced_works': 'references',
-                                      'authorships': 'authors'}, axis=1)
         df_counts = pd.melt(df_counts, 'doi', var_name='count', value_name='value')
         df_counts['doi'] = df_counts['doi'].str[16:]
         df_counts = df_counts.drop_duplicates().reset_index(drop=True)
         if len(df_counts) != 3*len(dois):
             if not df_counts[df_counts.duplicated(['doi', 'count'], keep=False)].empty:
-                st.warning('Not all counts are unique in OpenAlex:')
-                st.write(df_counts[df_counts.duplicated(['doi', 'count'], keep=False)])
-                st.warning('For each count, only one value has been kept.')
+                notify('Not all counts are unique in OpenAlex:', quiet, warning=True)
+                if not quiet:
+                    st.write(df_counts[df_counts.duplicated(['doi', 'count'], keep=False)])
+                notify('For each count, only one value has been kept.', quiet, warning=True)
                 df_counts = df_counts.drop_duplicates(['doi', 'count']).reset_index(drop=True)
     else:
         pass
     df_counts['database'] = 'OpenAlex'
-    st.write(f'OpenAlex data loaded in %.2f seconds.' % (time.time() - start_time))
+    notify(f'OpenAlex data loaded in %.2f seconds (%.1f kB compressed response per DOI).'
+           % (time.time() - start_time, size / 1000 / max(len(dois), 1)), quiet)
     return df_counts
 
 
 @st.cache_data(show_spinner=False)
-def get_opencitations_index_counts(dois, opencitations_access_token=''):
+def get_opencitations_index_counts(dois, opencitations_access_token='', quiet=False):
     """Returns a df containing counts for citation, author and reference.
     In the case where there is no citation or reference,
     counts for those metadata are set to 0 when some metadata is associated to the doi,
@@ -147,12 +337,14 @@ def get_opencitations_index_counts(dois, opencitations_access_token=''):
     for doi in dois:
         url = 'https://opencitations.net/index/api/v2/citation-count/doi:' + doi
         r = requests.get(url, headers=headers)
+        raise_for_provider_error(r)
         if r and len(r.json()) > 0:
             citations += [int(r.json()[0]['count'])]
         else:
             citations += [np.nan]
         url = 'https://opencitations.net/index/api/v2/reference-count/doi:' + doi
         r = requests.get(url, headers=headers)
+        raise_for_provider_error(r)
         if r and len(r.json()) > 0:
             references += [int(r.json()[0]['count'])]
         else:
@@ -162,14 +354,14 @@ def get_opencitations_index_counts(dois, opencitations_access_token=''):
                               "references": references})
     df_counts = pd.melt(df_counts, 'doi', var_name='count', value_name='value')
     df_counts['database'] = 'OpenCitations'
-    st.write(f'*Citation-count* and *reference-count* queries of OpenCitations Index data '
-             f'loaded in %.2f seconds.' % (time.time() - start_time))
+    notify(f'*Citation-count* and *reference-count* queries of OpenCitations Index data '
+           f'loaded in %.2f seconds.' % (time.time() - start_time), quiet)
     # st.write(f'OpenCitations Index data loaded in %.2f seconds.' % (time.time() - start_time))
     return df_counts
 
 
 @st.cache_data(show_spinner=False)
-def get_opencitations_meta_counts(dois, opencitations_access_token=''):
+def get_opencitations_meta_counts(dois, opencitations_access_token='', quiet=False):
     start_time = time.time()
     headers = {"authorization": f"{opencitations_access_token}"}
     
@@ -177,32 +369,25 @@ def get_opencitations_meta_counts(dois, opencitations_access_token=''):
     
     for doi in dois:
         url = f'https://opencitations.net/meta/api/v1/metadata/doi:{doi}'
+        r = requests.get(url, headers=headers)
+        raise_for_provider_error(r)
+        if not r:  # other client errors are specific to the DOI, which is skipped
+            notify(f"OpenCitations Meta error for DOI {doi}: HTTP {r.status_code}", quiet, warning=True)
+            continue
         try:
-            r = requests.get(url, headers=headers)
-            try:
-                r.raise_for_status()
-                result = r.json()
-            except requests.exceptions.JSONDecodeError:
-                st.error(f"OpenCitations API returned non-JSON response: {r.text[:500]}")
-                return []
-            except requests.exceptions.HTTPError as e:
-                st.error(f"HTTP error: {e} – Response: {r.text[:500]}")
-                return []
-
-            if not isinstance(result, list) or not result:
-                continue
-
-            metadata = result[0]  # assume first record is most relevant
-            record = {
-                'doi': doi,
-                'authors': metadata.get('author', '').count(';') + (1 if metadata.get('author', '') else 0)
-            }
-            records.append(record)
-
-        except requests.RequestException as e:
-            st.warning(f"Request error for DOI {doi}: {e}")
-        except Exception as e:
-            st.warning(f"Unexpected error for DOI {doi}: {e}")
+            result = r.json()
+        except requests.exceptions.JSONDecodeError:
+            raise FetchError(f"OpenCitations API returned non-JSON response: {r.text[:500]}")
+
+        if not isinstance(result, list) or not result:
+            continue
+
+        metadata = result[0]  # assume first record is most relevant
+        record = {
+            'doi': doi,
+            'authors': metadata.get('author', '').count(';') + (1 if metadata.get('author', '') else 0)
+        }
+        records.append(record)
 
     if not records:
         return pd.DataFrame()
@@ -211,11 +396,12 @@ def get_opencitations_meta_counts(dois, opencitations_access_token=''):
     df_counts = pd.melt(df_counts, id_vars='doi', var_name='count', value_name='value')
     df_counts['database'] = 'OpenCitations'
 
-    st.write(f'*Metadata* queries from OpenCitations Meta completed in %.2f seconds.' % (time.time() - start_time))
+    notify(f'*Metadata* queries from OpenCitations Meta completed in %.2f seconds.' % (time.time() - start_time),
+           quiet)
     return df_counts
 
 @st.cache_data(show_spinner=False)
-def get_semanticscholar_counts(dois, semanticscholar_api_key=''):
+def get_semanticscholar_counts(dois, semanticscholar_api_key='', quiet=False):
     start_time = time.time()
     headers = {"x-api-key": f"{semanticscholar_api_key}"}
     url = f"https://api.semanticscholar.org/graph/v1/paper/batch"
@@ -226,8 +412,13 @@ def get_semanticscholar_counts(dois, semanticscholar_api_key=''):
     data = json.dumps({"ids": dois})
     r = requests.post(url, headers=headers, params=params, data=data)
     all_results = r.json()
-    if not ((str(all_results)[2:7] == 'error') | (str(all_results)[2:9] == 'message')):
-        all_results = [x for x in all_results if x is not None]
+    if (str(all_results)[2:7] == 'error') | (str(all_results)[2:9] == 'message'):
+        # e.g. rate limit or invalid request
+        raise FetchError(f'Message from Semantic Scholar: "{all_results.get("message", all_results.get("error"))}"')
+    all_results = [x for x in all_results if x is not None]
+    if not all_results:
+        df_counts = pd.DataFrame()
+    else:
         df_counts = pd.DataFrame(all_results)
         external_ids = df_counts['externalIds'].apply(pd.Series)
         if 'DOI' in external_ids.columns:
@@ -244,14 +435,8 @@ def get_semanticscholar_counts(dois, semanticscholar_api_key=''):
         df_counts = df_counts.rename({'citationCount': 'citations',
                                       'referenceCount': 'references'}, axis=1)
         df_counts = pd.melt(df_counts, 'doi', var_name='count', value_name='value')
-    else:
-        if str(all_results)[2:9] == 'message':
-            st.write('Message from Semantic Scholar: "', all_results['message'], '"')
-            df_counts = pd.DataFrame()
-        else:
-            df_counts = pd.DataFrame()
     df_counts['database'] = 'Semantic Scholar'
-    st.write(f'Semantic Scholar data loaded in %.2f seconds.' % (time.time() - start_time))
+    notify(f'Semantic Scholar data loaded in %.2f seconds.' % (time.time() - start_time), quiet)
     return df_counts
 
 
@@ -271,7 +456,7 @@ def get_openaire_dois_list(dict_or_list, dois):
 
 
 @st.cache_data(show_spinner=False)
-def get_openaire_counts(dois):
+def get_openaire_counts(dois, quiet=False):
     start_time = time.time()
     base_url = "https://api.openaire.eu/graph/v2/researchProducts"
     headers = {"Accept": "application/json"}
@@ -283,31 +468,28 @@ def get_openaire_counts(dois):
             "pid": doi
         }
 
-        try:
-            r = requests.get(base_url, params=params, headers=headers)
-            r.raise_for_status()
-            result = r.json()
-
-            # Change: in API v2 the JSON structure has changed → records are inside "results", not directly in root
-            if result and "results" in result and len(result["results"]) > 0:
-                record = result["results"][0]
-
-                
-                author_count = len(record.get("authors", []))
-                citations = record.get("indicators", {}).get("citationImpact", {}).get("citationCount", None)
-                # Note: there is no direct "referenceCount" field in the JSON V2 response
-                references = None
-
-
-                all_records.append({
-                    "doi": doi.lower(),
-                    "citations": citations,
-                    "references": references,
-                    "authors": author_count
-                })
-
-        except Exception as e:
-            st.warning(f"OpenAIRE error for DOI {doi}: {e}")
+        r = requests.get(base_url, params=params, headers=headers)
+        raise_for_provider_error(r)
+        if not r:  # other client errors are specific to the DOI, which is skipped
+            notify(f"OpenAIRE error for DOI {doi}: HTTP {r.status_code}", quiet, warning=True)
+            continue
+        result = r.json()
+
+        # Change: in API v2 the JSON structure has changed → records are inside "results", not directly in root
+        if result and "results" in result and len(result["results"]) > 0:
+            record = result["results"][0]
+
+            author_count = len(record.get("authors", []))
+            citations = record.get("indicators", {}).get("citationImpact", {}).get("citationCount", None)
+            # Note: there is no direct "referenceCount" field in the JSON V2 response
+            references = None
+
+            all_records.append({
+                "doi": doi.lower(),
+                "citations": citations,
+                "references": references,
+                "authors": author_count
+            })
 
     if not all_records:
         return pd.DataFrame()
@@ -315,20 +497,65 @@ def get_openaire_counts(dois):
     df_counts = pd.DataFrame(all_records)
     df_counts = pd.melt(df_counts, id_vars='doi', var_name='count', value_name='value')
     df_counts['database'] = 'OpenAIRE'
-    st.write(f'OpenAIRE Graph API data loaded in %.2f seconds.' % (time.time() - start_time))
+    notify(f'OpenAIRE Graph API data loaded in %.2f seconds.' % (time.time() - start_time), quiet)
     return df_counts
 
+DATACITE_PAGE_SIZE = 1000  # maximum page size of the DataCite REST API
+DATACITE_MAX_QUERY_LENGTH = 1800  # url-encoded length of the query parameter, keeps the URL below 2048 characters
+
+
+def get_datacite_queries(dois):
+    """Splits the DOIs in queries of the form 'doi:"..." OR doi:"..."',
+    each query being shorter than the URL limit and returning at most one page"""
+    queries = []
+    terms = []
+    for doi in dois:
+        term = f'doi:"{doi}"'
+        if terms and ((len(terms) == DATACITE_PAGE_SIZE) |
+                      (len(quote_plus(' OR '.join(terms + [term]))) > DATACITE_MAX_QUERY_LENGTH)):
+            queries.append(' OR '.join(terms))
+            terms = []
+        terms.append(term)
+    if terms:
+        queries.append(' OR '.join(terms))
+    return queries
+
+
 @st.cache_data(show_spinner=False)
-def get_datacite_counts(dois):
+def get_datacite_counts(dois, quiet=False):
     start_time = time.time()
     url = 'https://api.datacite.org/dois'
-    # https: // api.datacite.org / dois?query = (doi:10.11570 / 18.0007 % 20OR % 20doi:10.11570 / 18.0006)
-    params = {
-        'query': '(doi:' + ' OR doi:'.join(dois) + ')'
-    }
-    r = requests.get(url, params=params)
-    results = r.json()
-    df_counts = pd.DataFrame(results['data'])
-    st.write(df_counts)
-    st.write(f'DataCite data loaded in %.2f seconds.' % (time.time() - start_time))
-    return 0
+    records = []
+    for query in get_datacite_queries(dois):
+        params = {
+            'query': query,
+            'fields[dois]': 'doi,citationCount,referenceCount,creators',
+            'page[size]': DATACITE_PAGE_SIZE,
+            'disable-facets': 'true'
+        }
+        r = requests.get(url, params=params)
+        while True:
+            r.raise_for_status()
+            results = r.json()
+            for item in results['data']:
+                attributes = item['attributes']
+                records.append({
+                    'doi': attributes['doi'].lower(),
+                    'citations': attributes.get('citationCount'),
+                    'references': attributes.get('referenceCount'),
+                    'authors': len(attributes['creators']) if isinstance(attributes.get('creators'), list) else np.nan
+                })
+            # Follow the pagination, the next link keeps the query and the fields
+            next_url = results.get('links', {}).get('next')
+            if not next_url:
+                break
+            r = requests.get(next_url)
+
+    if not records:
+        return pd.DataFrame()
+
+    df_counts = pd.DataFrame(records).drop_duplicates('doi')
+    df_counts = pd.melt(df_counts, id_vars='doi', var_name='count', value_name='value')
+    df_counts['database'] = 'DataCite'
+    notify(f'DataCite data loaded in %.2f seconds.' % (time.time() - start_time), quiet)
+    return df_counts
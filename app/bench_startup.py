@@ -0,0 +1,110 @@
+"""Startup and rerun time benchmark of the app.
+
+Each measure runs in a fresh Python process, as on a cold start of the app:
+- startup imports: the top-level imports of the app script, read from its source,
+- tab imports: viz and plotly, only imported once data is loaded,
+- cold run and rerun: the app script executed twice without `streamlit run`, with the cache warming
+  scheduler disabled. The script stops at the first paint, since no data is loaded in this mode.
+The benchmark fails if a module of the tabs (HEAVY_MODULES) is imported at startup or if a time exceeds
+its maximum. Streamlit itself imports the plotly package, so the plotly modules of the charts are checked:
+
+    python bench_startup.py
+    python bench_startup.py --repeat 10 --max-startup 3 --max-rerun 0.2
+"""
+import argparse
+import ast
+import os
+import statistics
+import subprocess
+import sys
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_SCRIPT = os.path.join(APP_DIR, 'QA_Streamlit_Count_Citations_v0.py')
+TAB_IMPORTS = ['import viz']
+HEAVY_MODULES = ['viz', 'plotly.express', 'plotly.graph_objects']  # only imported by the tabs
+
+
+def get_startup_imports(script=APP_SCRIPT):
+    """Returns the import statements at the top level of the script"""
+    with open(script) as f:
+        tree = ast.parse(f.read())
+    return [ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def run_python(code, repeat):
+    """Runs the code in fresh processes and returns the lines printed by each run"""
+    env = dict(os.environ, WARM_CACHE_SCHEDULER='0')
+    return [subprocess.run([sys.executable, '-c', code], cwd=APP_DIR, env=env,
+                           capture_output=True, text=True, check=True).stdout.splitlines()
+            for _ in range(repeat)]
+
+
+def measure_imports(statements, preloaded=(), repeat=5):
+    """Returns the median time in seconds of the import statements after the preloaded ones,
+    and the modules loaded by them"""
+    code = ('import sys, time\n'
+            + ''.join(f'{statement}\n' for statement in preloaded)
+            + 'before = set(sys.modules)\n'
+            + 'start_time = time.perf_counter()\n'
+            + ''.join(f'{statement}\n' for statement in statements)
+            + 'print(time.perf_counter() - start_time)\n'
+            + 'print(" ".join(sorted(set(sys.modules) - before)))\n')
+    outputs = run_python(code, repeat)
+    return statistics.median(float(output[-2]) for output in outputs), outputs[-1][-1].split()
+
+
+def measure_runs(script=APP_SCRIPT, repeat=5):
+    """Returns the median times in seconds of a cold run and of a rerun of the script"""
+    code = ('import time\n'
+            f'source = compile(open({script!r}).read(), {script!r}, "exec")\n'
+            'def run():\n'
+            '    start_time = time.perf_counter()\n'
+            '    try:\n'
+            '        exec(source, {"__name__": "__main__"})\n'
+            '    except KeyboardInterrupt:\n'
+            '        raise\n'
+            '    except BaseException:  # st.stop() and missing session data without streamlit run\n'
+            '        pass\n'
+            '    return time.perf_counter() - start_time\n'
+            'print(run())\n'
+            'print(run())\n')
+    outputs = run_python(code, repeat)
+    return (statistics.median(float(output[-2]) for output in outputs),
+            statistics.median(float(output[-1]) for output in outputs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-startup', type=float, default=None,
+                        help='fail if the startup imports take longer than this number of seconds')
+    parser.add_argument('--max-rerun', type=float, default=None,
+                        help='fail if a rerun of the script takes longer than this number of seconds')
+    args = parser.parse_args()
+
+    startup_imports = get_startup_imports()
+    startup_time, startup_modules = measure_imports(startup_imports, repeat=args.repeat)
+    tab_time, _ = measure_imports(TAB_IMPORTS, preloaded=startup_imports, repeat=args.repeat)
+    cold_run_time, rerun_time = measure_runs(repeat=args.repeat)
+    print(f'Startup imports ({"; ".join(startup_imports)}): %.2f seconds' % startup_time)
+    print(f'Tab imports ({"; ".join(TAB_IMPORTS)}): %.2f seconds' % tab_time)
+    print('Cold run of the script: %.2f seconds' % cold_run_time)
+    print('Rerun of the script: %.3f seconds' % rerun_time)
+
+    failed = False
+    heavy_modules = [module for module in HEAVY_MODULES if module in startup_modules]
+    if heavy_modules:
+        print(f'Regression: {", ".join(heavy_modules)} imported at startup')
+        failed = True
+    if args.max_startup is not None and startup_time > args.max_startup:
+        print(f'Regression: the startup imports take more than {args.max_startup} seconds')
+        failed = True
+    if args.max_rerun is not None and rerun_time > args.max_rerun:
+        print(f'Regression: a rerun takes more than {args.max_rerun} seconds')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
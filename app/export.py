@@ -0,0 +1,101 @@
+"""Export of the counts in chunks.
+
+The files are only generated when requested. Rows are written chunk by chunk to a binary file object,
+so that no text copy of the whole dataset is built in memory.
+"""
+import gzip
+import io
+
+
+CHUNK_SIZE = 10000  # rows
+
+FILE_FORMATS = ['csv', 'csv.gz', 'jsonl.gz', 'parquet']
+
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'csv.gz': 'application/gzip',
+    'jsonl.gz': 'application/gzip',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def get_file_format(path):
+    """Returns the file format of a path from its extension, e.g. 'counts.jsonl.gz' -> 'jsonl.gz'"""
+    for file_format in sorted(FILE_FORMATS, key=len, reverse=True):
+        if path.endswith('.' + file_format):
+            return file_format
+    raise ValueError(f'Unknown file format of {path}, use one of {", ".join(FILE_FORMATS)}')
+
+
+def iter_chunks(df, chunk_size=CHUNK_SIZE):
+    for i in range(0, len(df), chunk_size):
+        yield df.iloc[i:i + chunk_size]
+
+
+def write_csv(chunks, f):
+    header = True
+    for chunk in chunks:
+        f.write(chunk.to_csv(index=False, header=header).encode('utf-8'))
+        header = False
+
+
+def write_jsonl(chunks, f):
+    for chunk in chunks:
+        if not chunk.empty:
+            f.write(chunk.to_json(orient='records', lines=True).rstrip('\n').encode('utf-8') + b'\n')
+
+
+def get_parquet_schema(chunk):
+    """Returns the schema of the first chunk with float64 counts. A column which is empty in the first chunk
+    would be inferred as null, and an integer column would reject the missing counts of a later chunk"""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type) or pa.types.is_integer(field.type):
+            schema = schema.set(i, field.with_type(pa.float64()))
+    return schema
+
+
+def write_parquet(chunks, f):
+    """Writes one row group per chunk, with the schema of the first chunk"""
+    import pyarrow as pa  # installed with streamlit, only needed for this format
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                writer = pq.ParquetWriter(f, get_parquet_schema(chunk))
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write(chunks, f, file_format):
+    """Writes an iterable of df chunks to the binary file object f"""
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f'Unknown file format {file_format}, use one of {", ".join(FILE_FORMATS)}')
+    if file_format == 'parquet':
+        write_parquet(chunks, f)
+    elif file_format == 'csv':
+        write_csv(chunks, f)
+    else:
+        with gzip.GzipFile(fileobj=f, mode='wb') as gz:
+            if file_format == 'csv.gz':
+                write_csv(chunks, gz)
+            else:
+                write_jsonl(chunks, gz)
+
+
+def write_file(chunks, path):
+    with open(path, 'wb') as f:
+        write(chunks, f, get_file_format(path))
+
+
+def to_bytes(df, file_format, chunk_size=CHUNK_SIZE):
+    """Returns the exported df, e.g. for a download button"""
+    buffer = io.BytesIO()
+    write(iter_chunks(df, chunk_size), buffer, file_format)
+    return buffer.getvalue()
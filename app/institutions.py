@@ -0,0 +1,43 @@
+import pandas as pd
+
+
+df_swissuniversities_members = pd.DataFrame([
+    ['École Polytechnique Fédérale de Lausanne', 'https://openalex.org/I5124864'],
+    ['ETH Zurich', 'https://openalex.org/I35440088'],
+    ['University of Basel', 'https://openalex.org/I1850255'],
+    ['University of Bern', 'https://openalex.org/I118564535'],
+    ['University of Fribourg', 'https://openalex.org/I154338468'],
+    ['University of Geneva', 'https://openalex.org/I114457229'],
+    ['University of Lausanne', 'https://openalex.org/I97565354'],
+    ['University of Lucerne', 'https://openalex.org/I161941770'],
+    ['University of Neuchâtel', 'https://openalex.org/I57825437'],
+    ['University of St. Gallen', 'https://openalex.org/I202963720'],
+    ['Università della Svizzera italiana', 'https://openalex.org/I57201433'],
+    ['University of Zurich', 'https://openalex.org/I202697423'],
+    ['Bern University of Applied Sciences', 'https://openalex.org/I130692619'],
+    ['University of Applied Sciences of the Grisons', 'https://openalex.org/I4210120439'],
+    ['University of Applied Sciences and Arts Northwestern Switzerland', 'https://openalex.org/I2972652528'],
+    ['University of Applied Sciences and Arts Western Switzerland', 'https://openalex.org/I173439891'],
+    ['Lucerne University of Applied Sciences and Arts', 'https://openalex.org/I81007117'],
+    ['Kalaidos University of Applied Sciences', 'https://openalex.org/I3132934759'],
+    ['Ostschweizer Fachhochschule OST', 'https://openalex.org/I4210129390'],
+    ['University of Applied Sciences and Arts of Southern Switzerland', 'https://openalex.org/I15196421'],
+    ['Zurich University of the Arts', 'https://openalex.org/I64152125'],
+    ['ZHAW Zurich University of Applied Sciences', 'https://openalex.org/I200744771'],
+    ['Haute École Pédagogique BEJUNE', 'https://openalex.org/I4210101117'],
+    ['Haute École Pédagogique du Canton de Vaud', 'https://openalex.org/I4210106586'],
+    ['Pädagogische Hochschule Wallis', 'https://openalex.org/I4210141884'],
+    ['Haute École Pédagogique Fribourg', 'https://openalex.org/I4210137605'],
+    ['NMS Berne', 'https://openalex.org/I4210143584'],
+    ['University of Teacher Education in Special Needs', 'https://openalex.org/I4210086400'],
+    ['Pädagogische Hochschule Graubünden', 'https://openalex.org/I4210117930'],
+    ['Pädagogische Hochschule Bern', 'https://openalex.org/I4210160491'],
+    ['University of Teacher Education Lucerne', 'https://openalex.org/I4210112078'],
+    ['St.Gallen University of Teacher Education', 'https://openalex.org/I4210158813'],
+    ['Pädagogische Hochschule Schaffhausen', 'https://openalex.org/I4210139224'],
+    ['Schwyz University of Teacher Education', 'https://openalex.org/I4210095907'],
+    ['Thurgau University of Teacher Education', 'https://openalex.org/I4210138261'],
+    ['Zurich University of Teacher Education', 'https://openalex.org/I4210111868'],
+    ['University of Teacher Education Zug', 'https://openalex.org/I4210146564'],
+    ['Swiss Federal University for Vocational Education and Training SFUVET', 'https://openalex.org/I4210097053']],
+    columns=['institution_name', 'institution_id'])
@@ -0,0 +1,183 @@
+"""Write-ahead journal of a data load.
+
+A journal is a JSON lines file. The first line describes the run (DOIs, data sources and batch size),
+every following line records the result of one (data source, DOI batch) as soon as it is fetched.
+Completed batches are never fetched again; failed or missing batches are retried on resume:
+
+    python journal.py start dois.txt run.jsonl --sources Crossref OpenAlex
+    python journal.py resume run.jsonl
+    python journal.py status run.jsonl
+    python journal.py export run.jsonl counts.jsonl.gz
+"""
+import argparse
+import json as json
+import os
+
+import pandas as pd
+
+import export
+
+
+BATCH_SIZE = 20
+
+
+def get_batches(dois, batch_size=BATCH_SIZE):
+    return [dois[i:i + batch_size] for i in range(0, len(dois), batch_size)]
+
+
+def append(path, entry):
+    """Appends one line to the journal and flushes it to disk before returning.
+    A line truncated by a crash is terminated first, so that the new entry stays on its own line"""
+    with open(path, 'ab+') as f:
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                f.write(b'\n')
+        f.write((json.dumps(entry) + '\n').encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read(path):
+    """Returns the run description and a dict {(source, batch): entry} with the last entry of each batch.
+    A truncated last line, e.g. after a crash while writing, is ignored"""
+    run = None
+    entries = {}
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry['type'] == 'run':
+                run = entry
+            else:
+                entries[(entry['source'], entry['batch'])] = entry
+    return run, entries
+
+
+def start(path, dois, sources, batch_size=BATCH_SIZE):
+    """Creates the journal if it does not exist yet and returns its run description.
+    A journal whose run description is damaged (crash during the first write) is started again"""
+    if os.path.exists(path):
+        run, _ = read(path)
+        if run is not None:
+            if (run['dois'], run['sources']) != (list(dois), list(sources)):
+                raise ValueError(f'Journal {path} belongs to another run')
+            return run
+        os.remove(path)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    run = {'type': 'run', 'dois': list(dois), 'sources': list(sources), 'batch_size': batch_size}
+    append(path, run)
+    return run
+
+
+def get_pending(path, sources=None):
+    """Returns the (source, batch, dois) which are failed or missing in the journal"""
+    run, entries = read(path)
+    if run is None:
+        raise ValueError(f'Journal {path} has no run description, start it again')
+    pending = []
+    for source in sources or run['sources']:
+        for batch, dois in enumerate(get_batches(run['dois'], run['batch_size'])):
+            entry = entries.get((source, batch))
+            if entry is None or entry['status'] != 'done':
+                pending.append((source, batch, dois))
+    return pending
+
+
+def fetch(path, fetch_counts, sources=None):
+    """Fetches the pending batches with fetch_counts(source, dois), which returns long-format counts
+    and raises when the data source fails, and records each result in the journal.
+    Returns the entries of the failed batches"""
+    failed = []
+    for source, batch, dois in get_pending(path, sources):
+        entry = {'type': 'batch', 'source': source, 'batch': batch}
+        try:
+            df = fetch_counts(source, dois)
+            entry['status'] = 'done'
+            entry['records'] = json.loads(df.to_json(orient='records'))
+        except Exception as e:
+            entry['status'] = 'failed'
+            entry['error'] = str(e)
+            failed.append(entry)
+        append(path, entry)
+    return failed
+
+
+def iter_batches(path, sources=None):
+    """Yields the long-format counts of each completed batch while reading the journal,
+    so that only one batch is held in memory"""
+    done = set()
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            key = (entry.get('source'), entry.get('batch'))
+            if entry['type'] == 'batch' and entry['status'] == 'done' and key not in done \
+                    and (sources is None or entry['source'] in sources):
+                done.add(key)
+                if entry['records']:
+                    yield pd.DataFrame(entry['records'])
+
+
+def load(path, sources=None):
+    """Returns the long-format counts of the completed batches"""
+    frames = list(iter_batches(path, sources))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames).reset_index(drop=True)
+
+
+def main():
+    import api_queries as api
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_start = subparsers.add_parser('start', help='create a journal and fetch all batches')
+    parser_start.add_argument('doi_file', help='text file with one DOI per line')
+    parser_start.add_argument('journal')
+    parser_start.add_argument('--sources', nargs='+', default=api.DATA_SOURCES, choices=api.DATA_SOURCES)
+    parser_start.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    parser_resume = subparsers.add_parser('resume', help='fetch the failed or missing batches of a journal')
+    parser_resume.add_argument('journal')
+
+    parser_status = subparsers.add_parser('status', help='print the number of done and pending batches')
+    parser_status.add_argument('journal')
+
+    parser_export = subparsers.add_parser('export', help='write the counts of the completed batches to a file')
+    parser_export.add_argument('journal')
+    parser_export.add_argument('output', help=f'output file, with one of the extensions {", ".join(export.FILE_FORMATS)}')
+
+    for subparser in (parser_start, parser_resume):
+        subparser.add_argument('--email', default='',
+                               help='email address for the Crossref and OpenAlex polite pool')
+
+    args = parser.parse_args()
+    if args.command in ('start', 'resume'):
+        if args.command == 'start':
+            with open(args.doi_file) as f:
+                start(args.journal, api.format_doi_list(f.read().splitlines()), args.sources, args.batch_size)
+        settings = {
+            'my_email_address': args.email,
+            'opencitations_access_token': os.environ.get('OPENCITATIONS_ACCESS_TOKEN', ''),
+            'semanticscholar_api_key': os.environ.get('SEMANTICSCHOLAR_API_KEY', ''),
+        }
+        failed = fetch(args.journal, lambda source, dois: api.get_counts(source, dois, cached=False, quiet=True,
+                                                                    **settings))
+        if failed:
+            print(f'{len(failed)} failed batches, run "python journal.py resume {args.journal}" to retry them')
+    elif args.command == 'status':
+        run, entries = read(args.journal)
+        print(f'{len([e for e in entries.values() if e["status"] == "done"])} batches done, '
+              f'{len(get_pending(args.journal))} batches failed or missing')
+    else:
+        export.write_file(iter_batches(args.journal), args.output)
+
+
+if __name__ == '__main__':
+    main()
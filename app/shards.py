@@ -0,0 +1,203 @@
+"""Sharded fetch runner for large DOI sets.
+
+The DOIs are partitioned by a stable hash into shards. Each shard is fetched by a worker process
+and written to its own file in the output directory; a shard whose file exists is complete.
+The batches of an incomplete shard are recorded in its journal (see journal.py) and are not fetched again.
+The first run writes a manifest (number of shards, hash of the DOIs, sources) to the output directory,
+and runs with other parameters are rejected, so that shards of different partitions are never merged.
+Several machines can share the work by giving each one a node index, then merging the shard files:
+
+    python shards.py run dois.txt out/ --num-shards 64 --num-workers 4 --node-index 0 --num-nodes 2
+    python shards.py merge out/ counts.parquet
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import json as json
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+import api_queries as api
+import export
+import journal
+
+
+BATCH_SIZE = journal.BATCH_SIZE  # same limit as in the app, the batch APIs are queried with one request per batch
+
+# Overall requests per second allowed for each data source, shared between all workers of all nodes
+REQUESTS_PER_SECOND = {
+    'Crossref': 5,
+    'DataCite': 10,
+    'OpenAlex': 10,
+    'OpenCitations': 3,
+    'Semantic Scholar': 1,
+    'OpenAIRE': 2,
+}
+
+# Number of requests sent for one batch: one per batch, or some per DOI for the single-DOI APIs
+REQUESTS_PER_DOI = {
+    'OpenCitations': 3,  # citation-count, reference-count and meta
+    'OpenAIRE': 1,
+}
+
+
+def get_shard(doi, num_shards):
+    """Returns the shard index of a DOI. Unlike hash(), md5 is stable across processes and machines"""
+    return int(hashlib.md5(doi.encode('utf-8')).hexdigest(), 16) % num_shards
+
+
+def partition(dois, num_shards):
+    """Returns a list of num_shards DOI lists"""
+    shards = [[] for _ in range(num_shards)]
+    for doi in dois:
+        shards[get_shard(doi, num_shards)].append(doi)
+    return shards
+
+
+def get_shard_path(out_dir, shard_index):
+    return os.path.join(out_dir, f'shard-{shard_index:05d}.csv')
+
+
+def check_manifest(out_dir, dois, sources, num_shards):
+    """Writes the manifest of the run to out_dir, or checks that the existing manifest matches the run.
+    Raises ValueError if out_dir belongs to another run"""
+    manifest = {
+        'num_shards': num_shards,
+        'dois_md5': hashlib.md5('\n'.join(sorted(dois)).encode('utf-8')).hexdigest(),
+        'sources': sorted(sources),
+    }
+    path = os.path.join(out_dir, 'manifest.json')
+    try:
+        with open(path, 'x') as f:  # exclusive creation, several nodes can start at once
+            json.dump(manifest, f)
+        return
+    except FileExistsError:
+        pass
+    with open(path) as f:
+        existing = json.load(f)
+    if existing != manifest:
+        differences = ', '.join(key for key in manifest if existing.get(key) != manifest[key])
+        raise ValueError(f'{out_dir} belongs to another run (different {differences}), use another directory')
+
+
+def get_batch_interval(source, batch_size, total_workers):
+    """Returns the minimum number of seconds between two batches of one worker"""
+    requests_per_batch = REQUESTS_PER_DOI.get(source, 1 / batch_size) * batch_size
+    return requests_per_batch * total_workers / REQUESTS_PER_SECOND[source]
+
+
+def run_shard(shard_index, dois, sources, out_dir, settings, total_workers=1, batch_size=BATCH_SIZE):
+    """Fetches the counts of all sources for one shard and writes them to the shard file.
+    Each batch is recorded in the shard journal, so that a restarted shard only fetches the failed or
+    missing batches. The shard file is written once all batches are done"""
+    logging.getLogger('streamlit').setLevel(logging.ERROR)  # st.cache_data outside of the app
+    path = get_shard_path(out_dir, shard_index)
+    journal_path = path[:-len('.csv')] + '.jsonl'
+    journal.start(journal_path, dois, sources, batch_size)
+
+    def fetch_counts(source, batch_dois):
+        start_time = time.time()
+        try:
+            return api.get_counts(source, batch_dois, cached=False, quiet=True, **settings)
+        finally:
+            interval = get_batch_interval(source, batch_size, total_workers)
+            time.sleep(max(0., interval - (time.time() - start_time)))
+
+    failed = journal.fetch(journal_path, fetch_counts)
+    if failed:
+        raise RuntimeError(f'{len(failed)} failed batches ({failed[0]["error"]}), restart the run to retry them')
+    with open(path + '.tmp', 'wb') as f:
+        export.write(journal.iter_batches(journal_path), f, 'csv')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def run(dois, sources, out_dir, settings, num_shards=16, num_workers=4, node_index=0, num_nodes=1):
+    """Fetches the shards assigned to this node (shard_index % num_nodes == node_index) in a process pool.
+    Shards already written to out_dir are skipped, so an interrupted run can be restarted.
+    Returns the indices of the failed shards. Raises ValueError if out_dir belongs to another run"""
+    os.makedirs(out_dir, exist_ok=True)
+    dois = api.format_doi_list(dois)
+    check_manifest(out_dir, dois, sources, num_shards)
+    shards = partition(dois, num_shards)
+    pending = [i for i in range(node_index, num_shards, num_nodes)
+               if shards[i] and not os.path.exists(get_shard_path(out_dir, i))]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(run_shard, i, shards[i], sources, out_dir, settings,
+                                   num_workers * num_nodes): i
+                   for i in pending}
+        failed = []
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                print(f'Shard {futures[future]} written to {future.result()}')
+            except Exception as e:
+                print(f'Shard {futures[future]} failed: {e}')
+                failed.append(futures[future])
+    return sorted(failed)
+
+
+def iter_shards(out_dir):
+    """Yields the long-format counts of each shard file in out_dir.
+    The shards contain disjoint DOIs, so they can be exported one after the other"""
+    paths = sorted(os.path.join(out_dir, f) for f in os.listdir(out_dir)
+                   if f.startswith('shard-') and f.endswith('.csv'))
+    for path in paths:
+        try:
+            yield pd.read_csv(path, dtype={'doi': str, 'count': str, 'database': str, 'value': float})
+        except pd.errors.EmptyDataError:  # shard without any count
+            pass
+
+
+def merge(out_dir):
+    """Returns the long-format counts of all shard files in out_dir"""
+    frames = list(iter_shards(out_dir))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_run = subparsers.add_parser('run', help='fetch the shards assigned to this node')
+    parser_run.add_argument('doi_file', help='text file with one DOI per line')
+    parser_run.add_argument('out_dir')
+    parser_run.add_argument('--sources', nargs='+', default=api.DATA_SOURCES, choices=api.DATA_SOURCES)
+    parser_run.add_argument('--num-shards', type=int, default=16)
+    parser_run.add_argument('--num-workers', type=int, default=4)
+    parser_run.add_argument('--node-index', type=int, default=0)
+    parser_run.add_argument('--num-nodes', type=int, default=1)
+    parser_run.add_argument('--email', default='', help='email address for the Crossref and OpenAlex polite pool')
+
+    parser_merge = subparsers.add_parser('merge', help='merge the shard files into one file')
+    parser_merge.add_argument('out_dir')
+    parser_merge.add_argument('output', help=f'output file, with one of the extensions {", ".join(export.FILE_FORMATS)}')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        with open(args.doi_file) as f:
+            dois = f.read().splitlines()
+        settings = {
+            'my_email_address': args.email,
+            'opencitations_access_token': os.environ.get('OPENCITATIONS_ACCESS_TOKEN', ''),
+            'semanticscholar_api_key': os.environ.get('SEMANTICSCHOLAR_API_KEY', ''),
+        }
+        try:
+            failed = run(dois, args.sources, args.out_dir, settings, args.num_shards, args.num_workers,
+                         args.node_index, args.num_nodes)
+        except ValueError as e:
+            sys.exit(str(e))
+        if failed:
+            sys.exit(f'{len(failed)} failed shards ({", ".join(map(str, failed))}), '
+                     f'run the same command again to retry them before merging')
+    else:
+        export.write_file(iter_shards(args.out_dir), args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""Persistent cache of random samples and their counts for the swissuniversities institutions.
+
+A scheduler refreshes in the background the samples older than the refresh interval, so that the app
+reads warm samples instead of querying OpenAlex and all data sources when an institution is picked.
+The requests are paced with the rate limits of shards.py, since they share the quota of the app users.
+The cache is a SQLite file with SAMPLES_PER_INSTITUTION samples per institution.
+It can also be refreshed from a cron job:
+
+    python warm_cache.py
+    python warm_cache.py --loop
+"""
+import argparse
+from contextlib import closing
+import json as json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+import api_queries as api
+import shards
+from institutions import df_swissuniversities_members
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_PATH = os.environ.get('WARM_CACHE_PATH', '.warm_cache.sqlite')
+SAMPLE_SIZE = 10
+SAMPLES_PER_INSTITUTION = 3  # shown by "Get new random sample of DOIs" before drawing live samples
+REFRESH_INTERVAL = 24 * 3600  # seconds
+CHECK_INTERVAL = 600  # seconds between two checks of the scheduler
+
+
+def connect(path=CACHE_PATH):
+    con = sqlite3.connect(path, timeout=30)
+    con.execute('CREATE TABLE IF NOT EXISTS samples ('
+                'institution_id TEXT, sample INTEGER, dois TEXT, sources TEXT, counts TEXT, created REAL, '
+                'PRIMARY KEY (institution_id, sample))')
+    return con
+
+
+def get_sample(institution_id, sample=0, path=CACHE_PATH):
+    """Returns (dois, sources, counts) of a cached sample,
+    or None if the institution is not cached or has less cached samples"""
+    if not os.path.exists(path):
+        return None
+    with closing(connect(path)) as con, con:
+        rows = con.execute('SELECT dois, sources, counts FROM samples WHERE institution_id = ? ORDER BY sample',
+                           (institution_id,)).fetchall()
+    if sample >= len(rows):
+        return None
+    dois, sources, counts = rows[sample]
+    return json.loads(dois), json.loads(sources), pd.DataFrame(json.loads(counts))
+
+
+def get_settings():
+    return {
+        'my_email_address': os.environ.get('POLITE_POOL_EMAIL', ''),
+        'opencitations_access_token': os.environ.get('OPENCITATIONS_ACCESS_TOKEN', ''),
+        'semanticscholar_api_key': os.environ.get('SEMANTICSCHOLAR_API_KEY', ''),
+    }
+
+
+def refresh_sample(institution_id, sample, sources=api.DATA_SOURCES, path=CACHE_PATH):
+    """Draws a new sample and stores its counts. Sources which fail are left out of the sample,
+    so that the app queries them live. Each request is followed by a pause to respect the rate limits"""
+    settings = get_settings()
+    get_openalex_sample = getattr(api.get_openalex_sample, '__wrapped__', api.get_openalex_sample)
+    dois = api.format_doi_list(get_openalex_sample(SAMPLE_SIZE, institution_id, settings['my_email_address']))
+    time.sleep(1 / shards.REQUESTS_PER_SECOND['OpenAlex'])
+    frames = []
+    loaded_sources = []
+    for source in sources:
+        start_time = time.time()
+        try:
+            frames.append(api.get_counts(source, dois, cached=False, quiet=True, **settings))
+            loaded_sources.append(source)
+        except Exception as e:
+            logger.warning(f'{source} error for {institution_id}: {e}')
+        time.sleep(max(0., shards.get_batch_interval(source, max(len(dois), 1), 1) - (time.time() - start_time)))
+    counts = pd.concat(frames) if frames else pd.DataFrame()
+    with closing(connect(path)) as con, con:
+        con.execute('INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?, ?, ?)',
+                    (institution_id, sample, json.dumps(dois), json.dumps(loaded_sources),
+                     counts.to_json(orient='records'), time.time()))
+
+
+def refresh(max_age=REFRESH_INTERVAL, path=CACHE_PATH):
+    """Refreshes the missing samples and the samples older than max_age seconds"""
+    with closing(connect(path)) as con, con:
+        created = {(institution_id, sample): t for institution_id, sample, t in
+                   con.execute('SELECT institution_id, sample, created FROM samples').fetchall()}
+    for institution_id in df_swissuniversities_members['institution_id']:
+        for sample in range(SAMPLES_PER_INSTITUTION):
+            if time.time() - created.get((institution_id, sample), 0) > max_age:
+                try:
+                    refresh_sample(institution_id, sample, path=path)
+                except Exception as e:
+                    logger.warning(f'Sample {sample} of {institution_id} could not be refreshed: {e}')
+
+
+def run_scheduler(max_age=REFRESH_INTERVAL, check_interval=CHECK_INTERVAL, path=CACHE_PATH):
+    while True:
+        refresh(max_age, path)
+        time.sleep(check_interval)
+
+
+def start_scheduler(max_age=REFRESH_INTERVAL, check_interval=CHECK_INTERVAL, path=CACHE_PATH):
+    """Starts the scheduler in a daemon thread and returns the thread"""
+    thread = threading.Thread(target=run_scheduler, args=(max_age, check_interval, path),
+                              name='warm_cache', daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loop', action='store_true', help='keep refreshing instead of refreshing once')
+    parser.add_argument('--max-age', type=float, default=REFRESH_INTERVAL,
+                        help='refresh the samples older than this number of seconds')
+    parser.add_argument('--path', default=CACHE_PATH)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger('streamlit').setLevel(logging.ERROR)  # st.cache_data outside of the app
+    if args.loop:
+        run_scheduler(args.max_age, path=args.path)
+    else:
+        refresh(args.max_age, args.path)
+
+
+if __name__ == '__main__':
+    main()